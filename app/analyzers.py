@@ -1,14 +1,40 @@
 
+import functools
 import io
+import os
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, List, Tuple
 import yaml
+
+try:
+    # Kernels Arrow (SIMD, sans GIL) pour la normalisation ; repli pandas sinon
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover
+    pa = None
+    pc = None
 from .models import TrialBalanceRow, AnalysisResult, KPI, TaxEstimate, Suggestion
 from .tax.france_2025 import France2025TaxEngine
 
-def load_params(path: str) -> Dict[str, Any]:
+# Parseur YAML C (libyaml) quand la roue PyYAML l'embarque — ~10x plus
+# rapide que le parseur pur Python, même sémantique safe_load
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_params_cached(path: str, mtime: float) -> Dict[str, Any]:
     with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        params = yaml.load(f, Loader=_YamlLoader)
+    # Trie préfixe -> catégorie dérivé une seule fois par (fichier, mtime),
+    # pour ne pas le reconstruire à chaque analyse.
+    params["_pcg_trie"] = _build_prefix_trie(params["pcg_mapping"])
+    return params
+
+
+def load_params(path: str) -> Dict[str, Any]:
+    # Mémoïsé par (chemin, mtime) : relit le YAML uniquement s'il a changé.
+    return _load_params_cached(path, os.path.getmtime(path))
 
 def normalize_trial_balance(df: pd.DataFrame) -> pd.DataFrame:
     req = {"account", "debit", "credit"}
@@ -17,38 +43,152 @@ def normalize_trial_balance(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     df["account"] = df["account"].astype(str).str.strip()
     for col in ["debit", "credit"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+        s = df[col]
+        # déjà numérique (lecteur Arrow/typé) : la coercition serait une
+        # passe objet complète pour rien
+        if not pd.api.types.is_numeric_dtype(s):
+            s = pd.to_numeric(s, errors="coerce")
+        df[col] = s.fillna(0.0)
     df["balance"] = df["debit"] - df["credit"]
     return df
 
-def prefix_sum(df: pd.DataFrame, prefixes: List[str]) -> float:
+def normalize_trial_balance_arrow(table: "pa.Table") -> pd.DataFrame:
+    """Variante Arrow de normalize_trial_balance.
+
+    Nettoyage des comptes et coercition numérique via les kernels Arrow
+    (vectorisés, exécutés hors GIL) ; la conversion pandas n'a lieu qu'en
+    sortie, sans double matérialisation de colonnes object.
+    """
+    req = {"account", "debit", "credit"}
+    if not req.issubset(set(table.column_names)):
+        raise ValueError(f"Colonnes requises manquantes: {req}")
+    account = pc.utf8_trim_whitespace(pc.cast(table["account"], pa.string()))
+    debit = pc.fill_null(pc.cast(table["debit"], pa.float64()), 0.0)
+    credit = pc.fill_null(pc.cast(table["credit"], pa.float64()), 0.0)
+    balance = pc.subtract(debit, credit)
+    cols = {"account": account, "debit": debit, "credit": credit, "balance": balance}
+    for name in table.column_names:
+        if name not in cols:
+            cols[name] = table[name]
+    return pa.table(cols).to_pandas()
+
+def prefix_sum(df: pd.DataFrame, prefixes: List[str], _head_cache: Dict[int, np.ndarray] | None = None) -> float:
+    """Somme des soldes des comptes commençant par l'un des préfixes.
+
+    Une seule passe sur la colonne par longueur de préfixe (np.isin fait le
+    test d'appartenance en C) au lieu d'un str.startswith par préfixe.
+    """
     if not prefixes:
         return 0.0
-    mask = pd.Series(False, index=df.index)
+    by_len: Dict[int, List[str]] = {}
     for p in prefixes:
-        mask = mask | df["account"].str.startswith(p)
-    return float(df.loc[mask, "balance"].sum())
+        by_len.setdefault(len(p), []).append(p)
+
+    accounts = df["account"].to_numpy(dtype=object) if _head_cache is None else None
+    mask = np.zeros(len(df), dtype=bool)
+    for length, group in by_len.items():
+        if _head_cache is not None:
+            heads = _head_cache.get(length)
+            if heads is None:
+                heads = _head_cache[length] = df["account"].str.slice(0, length).to_numpy(dtype=object)
+        else:
+            heads = np.array([a[:length] for a in accounts], dtype=object)
+        mask |= np.isin(heads, np.asarray(group, dtype=object))
+    return float(df["balance"].to_numpy()[mask].sum())
+
+# Clé pcg_mapping -> nom de composante KPI. Sert à classer chaque compte
+# une seule fois puis à sommer par catégorie en une passe (groupby), au lieu
+# de re-balayer la colonne balance pour chaque famille de préfixes.
+_CATEGORY_BY_PCG_KEY = {
+    "sales_prefix": "revenue",
+    "purchases_prefix": "purchases",
+    "external_charges_prefix": "external",
+    "taxes_prefix": "taxes",
+    "payroll_prefix": "payroll",
+    "depreciation_prefix": "depreciation",
+    "financial_income_prefix": "fin_income",
+    "financial_expenses_prefix": "fin_exp",
+    "exceptional_income_prefix": "excep_income",
+    "exceptional_expenses_prefix": "excep_exp",
+    "cash_prefix": "cash",
+    "receivables_prefix": "receivables",
+    "payables_prefix": "payables",
+}
+
+
+def _build_prefix_trie(pcg: Dict[str, Any]) -> Dict[str, Any]:
+    """Trie caractère par caractère de tous les préfixes PCG.
+
+    La clé "$" d'un nœud porte la catégorie du préfixe qui s'y termine ;
+    la descente retient la dernière catégorie vue = préfixe le plus long.
+    """
+    trie: Dict[str, Any] = {}
+    for key, cat in _CATEGORY_BY_PCG_KEY.items():
+        for p in pcg.get(key, []):
+            node = trie
+            for ch in p:
+                node = node.setdefault(ch, {})
+            node["$"] = cat
+    return trie
+
+
+def _match_prefix(trie: Dict[str, Any], account: str):
+    node = trie
+    cat = None
+    for ch in account:
+        node = node.get(ch)
+        if node is None:
+            break
+        found = node.get("$")
+        if found is not None:
+            cat = found
+    return cat
+
+
+def categorize_accounts(df: pd.DataFrame, pcg: Dict[str, Any],
+                        trie: Dict[str, Any] | None = None) -> pd.Series:
+    """Catégorie KPI de chaque ligne (NaN si aucun préfixe ne correspond).
+
+    Les comptes sont factorisés puis chaque compte unique descend une seule
+    fois dans le trie : O(longueur de préfixe) par compte, indépendamment du
+    nombre de préfixes configurés.
+    """
+    if trie is None:
+        trie = _build_prefix_trie(pcg)
+    codes, uniques = pd.factorize(df["account"])
+    cats_u = np.array([_match_prefix(trie, a) or np.nan for a in uniques], dtype=object)
+    return pd.Series(cats_u.take(codes), index=df.index, dtype=object)
+
 
 def compute_kpi(df: pd.DataFrame, params: Dict[str, Any]) -> Tuple[KPI, Dict[str, float]]:
     pcg = params["pcg_mapping"]
-    revenue = prefix_sum(df, pcg["sales_prefix"]) * -1  # sens comptable (produits au crédit)
-    purchases = prefix_sum(df, pcg["purchases_prefix"])
-    external = prefix_sum(df, pcg["external_charges_prefix"])
-    taxes = prefix_sum(df, pcg["taxes_prefix"])
-    payroll = prefix_sum(df, pcg["payroll_prefix"])
-    depreciation = prefix_sum(df, pcg["depreciation_prefix"])
-    fin_income = prefix_sum(df, pcg["financial_income_prefix"]) * -1
-    fin_exp = prefix_sum(df, pcg["financial_expenses_prefix"])
-    excep_income = prefix_sum(df, pcg["exceptional_income_prefix"]) * -1
-    excep_exp = prefix_sum(df, pcg["exceptional_expenses_prefix"])
+    cats = categorize_accounts(df, pcg, trie=params.get("_pcg_trie"))
+    # Réduction en une passe sur tableaux bruts : catégories encodées en
+    # entiers (factorize) puis somme par code via np.bincount pondéré.
+    codes, uniques = pd.factorize(cats)
+    balances = df["balance"].to_numpy(dtype=np.float64)
+    matched = codes >= 0  # -1 = compte hors pcg_mapping
+    totals = np.bincount(codes[matched], weights=balances[matched], minlength=len(uniques))
+    sums = dict(zip(uniques, totals))
+
+    revenue = sums.get("revenue", 0.0) * -1  # sens comptable (produits au crédit)
+    purchases = sums.get("purchases", 0.0)
+    external = sums.get("external", 0.0)
+    taxes = sums.get("taxes", 0.0)
+    payroll = sums.get("payroll", 0.0)
+    depreciation = sums.get("depreciation", 0.0)
+    fin_income = sums.get("fin_income", 0.0) * -1
+    fin_exp = sums.get("fin_exp", 0.0)
+    excep_income = sums.get("excep_income", 0.0) * -1
+    excep_exp = sums.get("excep_exp", 0.0)
 
     gross_margin = revenue - purchases
     ebitda_approx = revenue - purchases - external - taxes - payroll
     net_result = ebitda_approx - depreciation + fin_income - fin_exp + excep_income - excep_exp
 
-    cash = prefix_sum(df, pcg["cash_prefix"])
-    receivables = prefix_sum(df, pcg["receivables_prefix"])
-    payables = prefix_sum(df, pcg["payables_prefix"])
+    cash = sums.get("cash", 0.0)
+    receivables = sums.get("receivables", 0.0)
+    payables = sums.get("payables", 0.0)
     working_capital_need = receivables - payables
 
     ebitda_margin = (ebitda_approx / revenue * 100.0) if revenue else None
@@ -157,7 +297,15 @@ def suggestions(kpi: KPI, tax: TaxEstimate, components: Dict[str, float]) -> Lis
 
 def analyze_trial_balance(df: pd.DataFrame, *, turnover: float | None = None, params_path: str = "app/config/rates_fr_2025.yaml") -> AnalysisResult:
     params = load_params(params_path)
-    df = normalize_trial_balance(df)
+    if pa is not None and isinstance(df, pa.Table):
+        try:
+            df = normalize_trial_balance_arrow(df)
+        except pa.ArrowInvalid:
+            # colonnes non castables proprement (ex. séparateurs exotiques) :
+            # retombe sur la coercition pandas, plus permissive
+            df = normalize_trial_balance(df.to_pandas())
+    else:
+        df = normalize_trial_balance(df)
     kpi, components = compute_kpi(df, params)
 
     # Estimation IS
@@ -181,4 +329,6 @@ def analyze_trial_balance(df: pd.DataFrame, *, turnover: float | None = None, pa
     warnings = []
     if turnover is None:
         warnings.append("Le chiffre d’affaires n’a pas été fourni : l’éligibilité au taux réduit d’IS et la contribution sociale sont inférées de manière limitée.")
-    return AnalysisResult(kpi=kpi, tax=tax, suggestions=suggs, warnings=warnings)
+    # Enveloppe de sortie pure : les champs viennent de modèles déjà validés,
+    # model_construct évite une re-validation pydantic complète
+    return AnalysisResult.model_construct(kpi=kpi, tax=tax, suggestions=suggs, warnings=warnings)
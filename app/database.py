@@ -14,14 +14,26 @@ if not DATABASE_URL:
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10
+    pool_size=20,
+    max_overflow=40
 )
 
+# expire_on_commit=False: skip the re-SELECT of freshly committed rows —
+# handlers return the attributes they already have in memory
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,
     bind=engine
 )
 
 Base = declarative_base()
+
+
+def get_db():
+    """FastAPI dependency: yields a pooled session, always closed after use."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,9 +1,13 @@
 import os
 import imaplib
 import email
-import csv
+import email.policy
 import io
-from datetime import datetime
+import re
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import insert
 
 from .database import SessionLocal
 from .models_extended import InvoiceSale, InvoicePurchase
@@ -16,20 +20,36 @@ IMAP_PASSWORD = os.getenv("IMAP_PASSWORD")
 IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
 
 
+# dd/mm/yyyy or dd-mm-yyyy (and the us mm/dd variant, disambiguated below)
+_DMY_RE = re.compile(r"^(\d{1,2})[/-](\d{1,2})[/-](\d{4})$")
+
+
 def _parse_date(value: str):
     """
     Very simple date parser for invoice CSV.
-    Tries common formats, returns datetime.date or None if it fails.
+
+    ISO first via the C-level date.fromisoformat, then one precompiled
+    regex for the slash/dash formats — no strptime (slow, locale-aware).
+    Returns datetime.date or None if it fails.
     """
     if not value:
         return None
     value = value.strip()
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y"):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    m = _DMY_RE.match(value)
+    if not m:
+        return None
+    d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    try:
+        return date(y, mo, d)  # day-first (French CSVs)
+    except ValueError:
         try:
-            return datetime.strptime(value, fmt).date()
+            return date(y, d, mo)  # fall back to month-first
         except ValueError:
-            continue
-    return None
+            return None
 
 
 def _safe_float(v, default=0.0):
@@ -39,6 +59,28 @@ def _safe_float(v, default=0.0):
         return default
 
 
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Vectorized date parsing for a CSV column.
+
+    Bulk-parses the common ISO format in C, then falls back to the
+    per-value _parse_date only on the rows that did not match.
+    """
+    s = values.astype(str).str.strip()
+    out = pd.to_datetime(s, format="%Y-%m-%d", errors="coerce")
+    dates = out.dt.date.astype(object).where(out.notna(), None)
+    left = out.isna() & (s != "")
+    if left.any():
+        dates[left] = s[left].map(_parse_date)
+    return dates
+
+
+def _safe_floats(values: pd.Series) -> pd.Series:
+    """Vectorized _safe_float: comma decimals accepted, invalid -> 0.0."""
+    cleaned = values.astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0)
+
+
 def _connect_imap():
     if not IMAP_USER or not IMAP_PASSWORD:
         raise RuntimeError("IMAP_USER / IMAP_PASSWORD not configured")
@@ -63,51 +105,67 @@ def _process_invoice_csv(text: str):
 
     If 'type' is missing, we default to 'sale'.
     """
-    created_sales = 0
-    created_purchases = 0
+    # Pièce jointe vide ou sans données : on ne fait pas planter tout le
+    # fetch IMAP pour un fichier creux (pd.read_csv lèverait EmptyDataError)
+    if not text or not text.strip():
+        return 0, 0
+    try:
+        df = pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        return 0, 0
+    df.columns = [str(c).strip().lower() for c in df.columns]
+
+    def col(*names) -> pd.Series:
+        for name in names:
+            if name in df.columns:
+                return df[name]
+        return pd.Series("", index=df.index, dtype=object)
+
+    work = pd.DataFrame({
+        "number": col("number", "invoice_number").astype(str).str.strip(),
+        "client": col("client_name", "client").astype(str).str.strip(),
+        "issue_date": _parse_dates(col("issue_date", "date")),
+        "due_date": _parse_dates(col("due_date")),
+        "amount": _safe_floats(col("amount")),
+        "vat": _safe_floats(col("vat")),
+    })
+    work = work[work["number"] != ""]
+
+    # 'type' missing or empty defaults to 'sale'
+    is_purchase = col("type").astype(str).str.strip().str.lower() \
+        .str.startswith("purch").reindex(work.index, fill_value=False)
+
+    purchase_rows = work[is_purchase][
+        ["number", "issue_date", "due_date", "amount", "vat"]
+    ].assign(status="pending").to_dict("records")
+
+    # Les colonnes d'InvoiceSale diffèrent de celles du CSV : amount est le
+    # HT, la TVA du fichier est un montant, et client_name/issue_date/due_date
+    # sont NOT NULL — d'où les valeurs de repli
+    today = date.today()
+    sales_rows = [
+        {
+            "client_name": r["client"] or "Import IMAP",
+            "number": r["number"],
+            "issue_date": r["issue_date"] or today,
+            "due_date": r["due_date"] or r["issue_date"] or today,
+            "amount_ht": r["amount"],
+            "amount_ttc": r["amount"] + r["vat"],
+            "status": "draft",
+        }
+        for r in work[~is_purchase].to_dict("records")
+    ]
 
-    reader = csv.DictReader(io.StringIO(text))
+    # Un seul INSERT multi-lignes par table (fast executemany SQLAlchemy 2.x)
+    # au lieu d'un flush ORM par facture.
     with SessionLocal() as db:
-        for row in reader:
-            number = (row.get("number") or row.get("invoice_number") or "").strip()
-            if not number:
-                continue
-
-            issue_date = _parse_date(row.get("issue_date") or row.get("date") or "")
-            due_date = _parse_date(row.get("due_date") or "")
-            amount = _safe_float(row.get("amount"))
-            vat = _safe_float(row.get("vat") or 0)
-
-            inv_type = (row.get("type") or "sale").strip().lower()
-
-            if inv_type.startswith("purch"):
-                # Purchase invoice
-                obj = InvoicePurchase(
-                    number=number,
-                    issue_date=issue_date,
-                    due_date=due_date,
-                    amount=amount,
-                    vat=vat,
-                    status="pending",
-                )
-                db.add(obj)
-                created_purchases += 1
-            else:
-                # Sales invoice (default)
-                obj = InvoiceSale(
-                    number=number,
-                    issue_date=issue_date,
-                    due_date=due_date,
-                    amount=amount,
-                    vat=vat,
-                    status="draft",
-                )
-                db.add(obj)
-                created_sales += 1
-
+        if sales_rows:
+            db.execute(insert(InvoiceSale), sales_rows)
+        if purchase_rows:
+            db.execute(insert(InvoicePurchase), purchase_rows)
         db.commit()
 
-    return created_sales, created_purchases
+    return len(sales_rows), len(purchase_rows)
 
 
 def fetch_invoices_from_imap():
@@ -126,8 +184,9 @@ def fetch_invoices_from_imap():
     """
     m = _connect_imap()
 
-    # Search for UNSEEN emails in the selected folder
-    typ, data = m.search(None, "UNSEEN")
+    # Search for UNSEEN emails in the selected folder.
+    # UIDs (not sequence numbers) so the later batched STORE is idempotent.
+    typ, data = m.uid("search", None, "UNSEEN")
     if typ != "OK":
         m.logout()
         return {
@@ -144,49 +203,54 @@ def fetch_invoices_from_imap():
     total_purchases = 0
     file_count = 0
 
-    for msg_id in msg_ids:
-        typ, msg_data = m.fetch(msg_id, "(RFC822)")
-        if typ != "OK" or not msg_data:
-            continue
-
-        raw_email = msg_data[0][1]
-        msg = email.message_from_bytes(raw_email)
-
-        # Walk through all parts to find attachments
-        for part in msg.walk():
-            content_disposition = str(part.get("Content-Disposition") or "")
-
-            if "attachment" not in content_disposition.lower():
-                continue
-
+    # One FETCH round-trip for the whole UID set instead of one per message.
+    # BODY.PEEK[] keeps the \Seen flag untouched until we set it ourselves.
+    raw_emails = []
+    fetch_ok = not msg_ids
+    if msg_ids:
+        uid_set = b",".join(msg_ids)
+        typ, msg_data = m.uid("fetch", uid_set, "(BODY.PEEK[])")
+        if typ == "OK" and msg_data:
+            fetch_ok = True
+            raw_emails = [item[1] for item in msg_data
+                          if isinstance(item, tuple) and len(item) >= 2]
+
+    for raw_email in raw_emails:
+        msg = email.message_from_bytes(raw_email, policy=email.policy.default)
+
+        # Only attachments (skips multipart containers and inline bodies),
+        # and reject non-CSV on filename alone before any base64 decoding.
+        for part in msg.iter_attachments():
             filename = part.get_filename()
-            if not filename:
+            if not filename or not filename.lower().endswith(".csv"):
                 continue
 
-            # Only CSV for now
-            if not filename.lower().endswith(".csv"):
-                continue
-
-            file_bytes = part.get_payload(decode=True) or b""
             try:
-                text = file_bytes.decode("utf-8", errors="ignore")
+                content = part.get_content()
             except Exception:
                 continue
+            if isinstance(content, bytes):
+                content = content.decode("utf-8", errors="ignore")
+            elif not isinstance(content, str):
+                continue
 
-            s, p = _process_invoice_csv(text)
+            s, p = _process_invoice_csv(content)
             total_sales += s
             total_purchases += p
             file_count += 1
 
-        # Mark email as seen
-        m.store(msg_id, "+FLAGS", "\\Seen")
+    # Mark the whole batch as seen in a single STORE — mais seulement si le
+    # FETCH a abouti : sinon les messages restent UNSEEN et seront retentés
+    # au prochain passage au lieu d'être perdus
+    if msg_ids and fetch_ok:
+        m.uid("store", b",".join(msg_ids), "+FLAGS", "\\Seen")
 
     m.close()
     m.logout()
 
     return {
-        "ok": True,
-        "processed_messages": len(msg_ids),
+        "ok": fetch_ok,
+        "processed_messages": len(msg_ids) if fetch_ok else 0,
         "files": file_count,
         "sales_created": total_sales,
         "purchases_created": total_purchases,
@@ -1,18 +1,35 @@
+import hashlib
+import hmac
+import io
 import os
 import time
 import asyncio
+import concurrent.futures
+import functools
+import logging
 from typing import List, Optional
 from collections import defaultdict
 
 import httpx
+import numpy as np
+import orjson
 import pandas as pd
-from jose import jwt, JWTError
+
+try:
+    # Parse CSV multithreadé + colonnes typées ; repli pandas si absent
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pragma: no cover
+    pa = None
+    pacsv = None
+
+import jwt  # PyJWT : HMAC-SHA256 via hashlib/OpenSSL, nettement plus rapide que jose
 from fastapi import (
     FastAPI, UploadFile, File, HTTPException,
     Request, Response, Depends, Form
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response as PlainResponse
 from pydantic import BaseModel
 
 # ---------------------------------------------------------------------
@@ -69,25 +86,36 @@ class HTTPSRedirectMiddleware:
 
     async def __call__(self, scope, receive, send):
         if scope["type"] == "http":
-            headers = dict(scope.get("headers", []))
-            forwarded_proto = headers.get(b"x-forwarded-proto", b"https").decode()
-            
-            if forwarded_proto == "http":
-                host = headers.get(b"host", b"").decode()
+            # Un seul balayage de la liste d'en-têtes : pas de dict alloué
+            # sur chaque requête pour en lire deux valeurs
+            forwarded_proto = b"https"
+            host = b""
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-proto":
+                    forwarded_proto = value
+                elif name == b"host":
+                    host = value
+
+            if forwarded_proto == b"http":
                 path = scope.get("path", "")
                 query = scope.get("query_string", b"").decode()
-                url = f"https://{host}{path}"
+                url = f"https://{host.decode()}{path}"
                 if query:
                     url += f"?{query}"
-                
-                response = JSONResponse(
-                    {"detail": "Redirecting to HTTPS"},
-                    status_code=301,
-                    headers={"Location": url}
-                )
-                await response(scope, receive, send)
+
+                # 301 minimal écrit à la main : ligne de statut + Location,
+                # corps vide — pas de JSONResponse ni d'encodage JSON
+                await send({
+                    "type": "http.response.start",
+                    "status": 301,
+                    "headers": [
+                        (b"location", url.encode()),
+                        (b"content-length", b"0"),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": b""})
                 return
-        
+
         await self.app(scope, receive, send)
 
 # ---------------------------------------------------------------------
@@ -96,7 +124,10 @@ class HTTPSRedirectMiddleware:
 app = FastAPI(
     title="NUMMA API v2.0",
     description="API complète pour gestion PME avec intégration Bankin/Finary",
-    version="2.0.0"
+    version="2.0.0",
+    # Sérialisation orjson par défaut : les handlers renvoient dicts/modèles,
+    # CORSMiddleware pose les en-têtes — plus de JSONResponse artisanale
+    default_response_class=ORJSONResponse,
 )
 
 # =====================================================
@@ -132,24 +163,57 @@ app.add_middleware(
 # =====================================================
 # DATABASE SETUP
 # =====================================================
+# Incrémenter à chaque changement de schéma qui nécessite une migration :
+# tant que le marqueur correspond, le boot saute toute l'introspection
+SCHEMA_VERSION = 1
+
+
+def _read_schema_version() -> int | None:
+    from sqlalchemy import text
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT v FROM _schema_version")).scalar()
+    except Exception:
+        # Table absente (premier boot) ou base pas encore migrée
+        return None
+
+
+def _write_schema_version() -> None:
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS _schema_version (v INTEGER NOT NULL)"))
+        conn.execute(text("DELETE FROM _schema_version"))
+        conn.execute(text("INSERT INTO _schema_version (v) VALUES (:v)"), {"v": SCHEMA_VERSION})
+
+
 @app.on_event("startup")
 def create_tables():
     """Create all database tables on startup"""
     print("🚀 Initializing NUMMA Backend v2.0...")
-    
+
+    # Marqueur one-shot : sur un boot sain (redéploiement Railway, workers
+    # multiples) une seule requête suffit — zéro introspection, zéro create_all
+    if _read_schema_version() == SCHEMA_VERSION:
+        print("✅ Schema up to date (marker), skipping introspection")
+        return
+
     try:
         from sqlalchemy import inspect
+        # Une seule passe d'introspection, réutilisée pour le contrôle de
+        # schéma ET pour décider si create_all a quelque chose à faire.
         inspector = inspect(engine)
-        
+        existing = set(inspector.get_table_names())
+
         # Check if invoices_sales table exists and has old schema
-        if 'invoices_sales' in inspector.get_table_names():
+        if 'invoices_sales' in existing:
             columns = [col['name'] for col in inspector.get_columns('invoices_sales')]
-            
+
             if 'client_name' not in columns or 'amount_ttc' not in columns:
                 print("⚠️  Old schema detected! Resetting database...")
                 Base.metadata.drop_all(bind=engine)
                 print("🗑️  Old tables dropped")
-        
+                existing = set()
+
         # Import router models
         try:
             from .routers.employees import Employee
@@ -159,33 +223,46 @@ def create_tables():
             print("✅ Router models imported")
         except ImportError as e:
             print(f"⚠️  Could not import some models: {e}")
-        
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created")
-        
+
+        # Create only what is missing; when everything exists already, skip
+        # the per-table CREATE IF NOT EXISTS round-trips entirely
+        missing = set(Base.metadata.tables) - existing
+        if missing:
+            Base.metadata.create_all(bind=engine, checkfirst=True)
+            print(f"✅ Database tables created ({len(missing)} missing)")
+        else:
+            print("✅ Database tables up to date")
+
         # Print summary
         print("\n📊 Database Models:")
         print("  ✅ Core models (7): DailyCashflow, Client, Supplier, InvoiceSale, InvoicePurchase, BankTransaction, Alert")
         print("  ✅ Router models (4): Employee, Task, Pointage, User")
         print("  ✅ Banking models (8): BankAccount, BankTransactionEnhanced, Category, Budget, SyncLog, RecurringTransaction, FinancialGoal, WebhookEvent")
-        
+
+        # Pose le marqueur : les prochains boots s'arrêtent au SELECT initial
+        _write_schema_version()
+
     except Exception as e:
+        # Surface le vrai problème au lieu de relancer create_all à l'aveugle
         print(f"⚠️  Database error: {e}")
-        Base.metadata.create_all(bind=engine)
+        raise
 
 # =====================================================
 # CORS HEADERS HELPER
 # =====================================================
+# Dict construit une fois : les appelants ne font que le lire (Starlette le
+# recopie dans ses propres MutableHeaders), inutile d'en refabriquer un par réponse
+_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": ALLOWED_ORIGINS[0] if ALLOWED_ORIGINS else "*",
+    "Access-Control-Allow-Credentials": "true",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
+    "Access-Control-Allow-Headers": "*"
+}
+
+
 def get_cors_headers():
     """Standard CORS headers for all responses"""
-    origin = ALLOWED_ORIGINS[0] if ALLOWED_ORIGINS else "*"
-    return {
-        "Access-Control-Allow-Origin": origin,
-        "Access-Control-Allow-Credentials": "true",
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-        "Access-Control-Allow-Headers": "*"
-    }
+    return _CORS_HEADERS
 
 # =====================================================
 # GLOBAL OPTIONS HANDLER
@@ -193,11 +270,7 @@ def get_cors_headers():
 @app.options("/{full_path:path}")
 async def options_handler(full_path: str):
     """Handle all OPTIONS requests globally"""
-    return JSONResponse(
-        content={"message": "OK"},
-        status_code=200,
-        headers=get_cors_headers()
-    )
+    return {"message": "OK"}
 
 # ---------------------------------------------------------------------
 # AUTH & SECURITY
@@ -211,9 +284,21 @@ ALGO = "HS256"
 COOKIE_NAME = "session"
 
 
+# Empreintes des mots de passe COMPANY_*_PASSWORD figées à l'import : plus de
+# lecture d'environnement par tentative, et la comparaison porte sur deux
+# digests de taille fixe — compare_digest reste en temps constant
+_PW_HASHES = {
+    k[len("COMPANY_"):-len("_PASSWORD")]: hashlib.sha256(v.encode()).digest()
+    for k, v in os.environ.items()
+    if k.startswith("COMPANY_") and k.endswith("_PASSWORD")
+}
+
+
 def validate_company_password(company_id: str, password: str) -> bool:
-    expected = os.getenv(f"COMPANY_{company_id}_PASSWORD")
-    return bool(expected and password == expected)
+    expected = _PW_HASHES.get(company_id)
+    return expected is not None and hmac.compare_digest(
+        expected, hashlib.sha256(password.encode()).digest()
+    )
 
 
 def make_token(company_id: str, ttl_seconds: int = 60 * 60) -> str:
@@ -225,12 +310,21 @@ def make_token(company_id: str, ttl_seconds: int = 60 * 60) -> str:
     )
 
 
+@functools.lru_cache(maxsize=4096)
+def _decode_token(token: str) -> dict:
+    # Mémoïse la vérification (base64 + HMAC + parse JSON) par jeton brut ;
+    # l'expiration est revérifiée à chaque hit dans parse_token.
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
+
+
 def parse_token(token: str) -> str:
     try:
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
-        return decoded["sub"]
-    except JWTError:
+        decoded = _decode_token(token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(401, "Invalid or expired session")
+    if decoded.get("exp", 0) < time.time():
         raise HTTPException(401, "Invalid or expired session")
+    return decoded["sub"]
 
 
 def set_session_cookie(resp: Response, token: str):
@@ -257,30 +351,24 @@ def require_auth(request: Request):
 # ---------------------------------------------------------------------
 @app.get("/")
 def root():
-    return JSONResponse(
-        content={
-            "ok": True,
-            "service": "numma-api",
-            "version": "2.0.0",
-            "https": "enforced",
-            "banking_integration": True,
-            "total_routers": 18
-        },
-        headers=get_cors_headers()
-    )
+    return {
+        "ok": True,
+        "service": "numma-api",
+        "version": "2.0.0",
+        "https": "enforced",
+        "banking_integration": True,
+        "total_routers": 18
+    }
 
 
 @app.get("/health")
 def health():
-    return JSONResponse(
-        content={
-            "status": "ok",
-            "version": "2.0.0",
-            "routers": 18,
-            "banking": True
-        },
-        headers=get_cors_headers()
-    )
+    return {
+        "status": "ok",
+        "version": "2.0.0",
+        "routers": 18,
+        "banking": True
+    }
 
 
 # =====================================================
@@ -303,59 +391,154 @@ def reset_database(secret_key: str):
         
         print("✅ Database reset complete!")
         
-        return JSONResponse(
-            content={
-                "success": True,
-                "message": "Database reset successfully"
-            },
-            headers=get_cors_headers()
-        )
+        return {"success": True, "message": "Database reset successfully"}
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "error": str(e)},
-            headers=get_cors_headers()
         )
 
 
 # ---------------------------------------------------------------------
 # ANALYSIS
 # ---------------------------------------------------------------------
+_REQUIRED_AUDIT_COLS = frozenset({"account", "label", "debit", "credit"})
+
+_CSV_CONTENT_TYPES = {"text/csv", "text/plain", "application/csv", "application/vnd.ms-excel", "application/octet-stream"}
+
+
+def _money_array(s: pd.Series) -> np.ndarray:
+    """Colonne montant -> ndarray float64, NaN à zéro.
+
+    Le lecteur CSV d'Arrow type déjà debit/credit en numérique pour les
+    fichiers bien formés : dans ce cas la re-coercition pd.to_numeric
+    (passe complète + isnull + fillna sur objets) est sautée.
+    """
+    if not pd.api.types.is_numeric_dtype(s):
+        s = pd.to_numeric(s, errors="coerce")
+    return s.fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def check_csv_upload(file: UploadFile) -> None:
+    """Rejette les uploads manifestement non-CSV avant tout parsing.
+
+    Regarde le content-type annoncé puis les 4 premiers Ko du spool : un
+    binaire (octet NUL, non-UTF-8) ou un fichier sans séparateur est refusé
+    en 400 immédiat au lieu d'être poussé entier dans le parseur.
+    """
+    if file.content_type:
+        # Le media type peut porter des paramètres ("text/csv; charset=utf-8")
+        # et les navigateurs étiquettent souvent les .csv en text/plain
+        media_type = file.content_type.split(";", 1)[0].strip().lower()
+        if media_type not in _CSV_CONTENT_TYPES:
+            raise HTTPException(400, "Type de contenu non supporté (CSV attendu)")
+    head = file.file.read(4096)
+    file.file.seek(0)
+    if b"\x00" in head:
+        raise HTTPException(400, "Fichier binaire détecté (CSV attendu)")
+    try:
+        text = head.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(400, "Encodage non supporté (UTF-8 attendu)")
+    if head and "," not in text and ";" not in text:
+        raise HTTPException(400, "Aucun séparateur CSV détecté")
+
+
+def read_csv_upload(source):
+    """Parse un CSV uploadé, colonnes normalisées en minuscules.
+
+    `source` est un objet fichier binaire (UploadFile.file, spoolé sur disque
+    au-delà du seuil Starlette) ou des bytes — le corps n'est jamais dupliqué
+    intégralement en RAM avant parsing. Utilise le lecteur CSV d'Arrow
+    (multithreadé, lecture par blocs) quand pyarrow est installé et renvoie
+    alors la pa.Table telle quelle — l'analyseur la normalise via les kernels
+    Arrow sans repasser par des colonnes object pandas. Repli : DataFrame via
+    le moteur C de pandas.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if pacsv is not None:
+        table = pacsv.read_csv(source)
+        return table.rename_columns([str(c).strip().lower() for c in table.column_names])
+
+    # Pré-scan de l'en-tête seule pour connaître la casse réelle des colonnes,
+    # puis lecture limitée aux colonnes utiles à l'analyse, avec dtype explicite
+    # pour 'account' (évite l'inférence et la promotion int -> object).
+    header = pd.read_csv(source, nrows=0)
+    source.seek(0)
+    rename = {c: str(c).strip().lower() for c in header.columns}
+    usecols = [c for c, lc in rename.items() if lc in _REQUIRED_AUDIT_COLS]
+    dtype = {c: "string" for c in usecols if rename[c] in ("account", "label")}
+    df = pd.read_csv(source, usecols=usecols or None, dtype=dtype, engine="c")
+    df.columns = [rename.get(c, str(c).strip().lower()) for c in df.columns]
+    return df
+
+
+# Pool dédié aux analyses : pandas/Arrow relâchent le GIL dans leurs noyaux C,
+# donc les requêtes concurrentes se parallélisent au lieu de bloquer la boucle.
+_analysis_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 4)
+
+
+def fast_json(model, exclude_none: bool = False) -> PlainResponse:
+    """Encode un modèle pydantic directement en JSON via le sérialiseur Rust.
+
+    model_dump_json() utilise l'encodeur pydantic-core précompilé pour le
+    schéma du modèle : pas de dict Python intermédiaire ni de re-validation
+    response_model côté FastAPI (une Response renvoyée telle quelle court-
+    circuite la sérialisation du framework).
+    """
+    return PlainResponse(
+        content=model.model_dump_json(exclude_none=exclude_none),
+        media_type="application/json",
+    )
+
+
+def read_csv_upload_df(source) -> pd.DataFrame:
+    """read_csv_upload + conversion pandas, pour les chemins restés DataFrame."""
+    parsed = read_csv_upload(source)
+    if pa is not None and isinstance(parsed, pa.Table):
+        return parsed.to_pandas()
+    return parsed
+
+
+def _parse_and_analyze(source, turnover: float | None) -> AnalysisResult:
+    try:
+        df = read_csv_upload(source)
+    except Exception:
+        raise HTTPException(400, "CSV illisible")
+    return analyze_trial_balance(df, turnover=turnover)
+
+
 @app.post("/analyze/trial-balance", response_model=AnalysisResult)
 async def analyze_trial_balance_endpoint(
     file: UploadFile = File(...),
     turnover: float | None = None,
 ):
-    if not file.filename.endswith(".csv"):
+    if not file.filename.lower().endswith(".csv"):
         raise HTTPException(400, "Veuillez fournir un CSV.")
+    check_csv_upload(file)
 
-    import io
-    try:
-        df = pd.read_csv(io.BytesIO(await file.read()))
-        df.columns = df.columns.str.lower().str.strip()
-    except Exception:
-        raise HTTPException(400, "CSV illisible")
-
-    result = analyze_trial_balance(df, turnover=turnover)
-    return JSONResponse(
-        content=result.model_dump(),
-        headers=get_cors_headers()
+    # file.file est le SpooledTemporaryFile de Starlette : le parseur lit
+    # directement dedans (dans le pool), sans copie intégrale du corps en RAM
+    result = await asyncio.get_running_loop().run_in_executor(
+        _analysis_pool, functools.partial(_parse_and_analyze, file.file, turnover)
     )
+    return fast_json(result)
 
 
 @app.post("/analyze/json", response_model=AnalysisResult)
 async def analyze_json_endpoint(payload: dict):
-    try:
-        df = pd.DataFrame(payload["trial_balance"])
-        df.columns = df.columns.str.lower().str.strip()
-    except Exception:
-        raise HTTPException(400, "JSON invalide")
+    def work() -> AnalysisResult:
+        try:
+            df = pd.DataFrame(payload["trial_balance"])
+            df.columns = [str(c).strip().lower() for c in df.columns]
+        except Exception:
+            raise HTTPException(400, "JSON invalide")
+        return analyze_trial_balance(df, turnover=payload.get("turnover"))
 
-    result = analyze_trial_balance(df, payload.get("turnover"))
-    return JSONResponse(
-        content=result.model_dump(),
-        headers=get_cors_headers()
-    )
+    result = await asyncio.get_running_loop().run_in_executor(_analysis_pool, work)
+    return fast_json(result)
 
 
 # ---------------------------------------------------------------------
@@ -373,20 +556,14 @@ def login(body: LoginBody, response: Response):
 
     token = make_token(body.company_id)
     set_session_cookie(response, token)
-    
-    return JSONResponse(
-        content={"ok": True, "company_id": body.company_id},
-        headers=get_cors_headers()
-    )
+
+    return {"ok": True, "company_id": body.company_id}
 
 
 @app.post("/auth/logout")
 def logout(response: Response):
     response.delete_cookie(COOKIE_NAME, path="/")
-    return JSONResponse(
-        content={"ok": True},
-        headers=get_cors_headers()
-    )
+    return {"ok": True}
 
 
 # ---------------------------------------------------------------------
@@ -405,58 +582,151 @@ class ChatResponse(BaseModel):
     reply: str
 
 
-_last_call = defaultdict(float)
+# Borné : une entrée par company_id actif, purgée dès qu'elle expire —
+# le defaultdict précédent gardait chaque id vu pour toujours.
+# Horodatage en nanosecondes monotones entières : pas de flottants, pas de
+# sauts NTP de l'horloge murale.
+_last_call: dict = {}
+_LAST_CALL_MAX = 10_000
+_THROTTLE_INTERVAL_NS = 2_000_000_000  # 2 s
 
 
-def throttle(cid: str, interval=2.0):
-    now = time.time()
-    if now - _last_call[cid] < interval:
+def throttle(cid: str, interval_ns: int = _THROTTLE_INTERVAL_NS):
+    now = time.monotonic_ns()
+    if now - _last_call.get(cid, 0) < interval_ns:
         raise HTTPException(429, "Trop de requêtes")
+    if len(_last_call) >= _LAST_CALL_MAX:
+        # les entrées plus vieilles que l'intervalle ne throttlent plus rien
+        cutoff = now - interval_ns
+        for k in [k for k, t in _last_call.items() if t < cutoff]:
+            del _last_call[k]
+        while len(_last_call) >= _LAST_CALL_MAX:
+            _last_call.pop(next(iter(_last_call)))  # plus ancien (ordre d'insertion)
     _last_call[cid] = now
 
 
+@app.on_event("startup")
+async def init_openai_client():
+    # Client partagé : la poignée de main TCP+TLS vers OpenAI (~100 ms) n'est
+    # payée qu'une fois, et HTTP/2 multiplexe les chats concurrents.
+    app.state.openai_client = httpx.AsyncClient(
+        timeout=40,
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    await app.state.openai_client.aclose()
+
+
 async def call_openai_with_retry(payload, api_key, max_retries=4):
+    client = app.state.openai_client
     backoff = 1.5
-    async with httpx.AsyncClient(timeout=40) as client:
-        for attempt in range(max_retries):
-            r = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-                json=payload,
-            )
-            if r.status_code == 200:
-                return r.json()["choices"][0]["message"]["content"]
-            if r.status_code == 429:
-                await asyncio.sleep(backoff)
-                backoff *= 2
-                continue
-            raise HTTPException(502, f"OpenAI error {r.status_code}: {r.text[:200]}")
+    for attempt in range(max_retries):
+        r = await client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=payload,
+        )
+        if r.status_code == 200:
+            # orjson sur les bytes bruts : parse C SIMD, pas de détection
+            # d'encodage ni de machinerie httpx.json
+            return orjson.loads(r.content)["choices"][0]["message"]["content"]
+        if r.status_code == 429:
+            # Respecte le Retry-After annoncé plutôt que de sur-attendre
+            retry_after = r.headers.get("Retry-After")
+            try:
+                delay = float(retry_after) if retry_after else backoff
+            except ValueError:
+                delay = backoff
+            await asyncio.sleep(delay)
+            backoff *= 2
+            continue
+        raise HTTPException(502, f"OpenAI error {r.status_code}: {r.text[:200]}")
     raise HTTPException(429, "OpenAI rate limit reached")
 
 
+def require_auth_throttled(request: Request) -> str:
+    """Auth pour routes limitées : le throttle passe AVANT le décodage JWT.
+
+    Clé = valeur brute du cookie : un client abusif est rejeté en une
+    comparaison d'entiers, sans payer le HMAC-SHA256 ni le parse JSON du
+    token à chaque 429. En mono-processus le dict borné suffit ; un
+    blacklist Redis partagé ne s'impose qu'avec plusieurs replicas.
+    """
+    token = request.cookies.get(COOKIE_NAME)
+    if not token:
+        raise HTTPException(401, "Not authenticated")
+    throttle(token)
+    return parse_token(token)
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest, company_id: str = Depends(require_auth)):
+async def chat(req: ChatRequest, company_id: str = Depends(require_auth_throttled)):
     if not OPENAI_API_KEY:
         raise HTTPException(500, "Server missing OPENAI_API_KEY")
 
-    throttle(company_id)
-    payload = {
-        "model": "gpt-4o-mini",
-        "temperature": 0.2,
-        "messages": [
-            {
-                "role": "system",
-                "content": "Tu es Albert, assistant fiscal pour PME françaises.",
-            },
-            *[m.model_dump() for m in req.messages],
-        ],
-    }
+    payload = _chat_payload(req.messages)
     reply = await call_openai_with_retry(payload, OPENAI_API_KEY)
-    
-    return JSONResponse(
-        content={"reply": reply},
-        headers=get_cors_headers()
-    )
+
+    return {"reply": reply}
+
+
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest]
+
+
+class ChatBatchResponse(BaseModel):
+    replies: List[str]
+
+
+# Parties statiques du payload OpenAI figées à l'import : seul le tableau
+# messages est construit par requête
+_SYSTEM_MSG = {"role": "system", "content": "Tu es Albert, assistant fiscal pour PME françaises."}
+_BASE_PAYLOAD = {"model": "gpt-4o-mini", "temperature": 0.2}
+
+
+def _chat_payload(messages: List[ChatMessage]) -> dict:
+    # Accès direct aux attributs : ChatMessage n'a que deux champs str déjà
+    # validés, model_dump() par message serait du pur overhead
+    return {
+        **_BASE_PAYLOAD,
+        "messages": [_SYSTEM_MSG, *({"role": m.role, "content": m.content} for m in messages)],
+    }
+
+
+# OpenAI sert ~10 requêtes concurrentes par clé : au-delà on ne gagne
+# que des 429, en deçà on sérialise inutilement
+_openai_sem = asyncio.Semaphore(10)
+
+
+async def chat_many(payloads: List[dict]) -> List[str]:
+    """Dispatch borné de plusieurs complétions sur le client partagé.
+
+    asyncio.gather sous sémaphore : les requêtes partent en parallèle dans la
+    limite de concurrence de la clé, le retry/backoff existant de
+    call_openai_with_retry s'applique à chacune.
+    """
+    async def one(p: dict) -> str:
+        async with _openai_sem:
+            return await call_openai_with_retry(p, OPENAI_API_KEY)
+
+    return list(await asyncio.gather(*(one(p) for p in payloads)))
+
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest, company_id: str = Depends(require_auth_throttled)):
+    if not OPENAI_API_KEY:
+        raise HTTPException(500, "Server missing OPENAI_API_KEY")
+    if len(req.requests) > 20:
+        raise HTTPException(400, "20 conversations max par lot")
+
+    payloads = [_chat_payload(r.messages) for r in req.requests]
+    replies = await chat_many(payloads)
+    return ChatBatchResponse.model_construct(replies=replies)
 
 
 # =====================================================
@@ -476,11 +746,6 @@ app.include_router(users.router)
 app.include_router(email_import.router)
 app.include_router(finance.router)
 
-print("\n📦 Core routers loaded (11):")
-print("  ✅ bank, invoices, alerts, cashflow, overdue")
-print("  ✅ employees, tasks, pointages, users")
-print("  ✅ email_import, finance")
-
 # Banking routers v2.0 (7)
 app.include_router(accounts.router)
 app.include_router(sync.router)
@@ -490,11 +755,6 @@ app.include_router(analytics.router)
 app.include_router(webhooks.router)
 app.include_router(exports.router)
 
-print("\n🆕 Banking routers v2.0 loaded (7):")
-print("  ✅ accounts, sync, categories, budgets")
-print("  ✅ analytics, webhooks, exports")
-print("\n🎉 TOTAL: 18 routers loaded!")
-
 
 # ---------------------------------------------------------------------
 # AUDIT
@@ -521,39 +781,68 @@ class AuditResult(BaseModel):
     top_accounts: List[dict]
 
 
-@app.post("/audit/test", response_model=AuditResult)
-async def test_audit(
-    file: UploadFile = File(...),
-    standard: str = Form("IFRS"),
-    company_id: str = Depends(require_auth),
-):
-    import io
+def _run_audit(source, standard: str) -> AuditResult:
+    """Parse + calcule l'audit complet ; pensé pour tourner hors boucle.
 
-    df = pd.read_csv(io.BytesIO(await file.read()))
-    df.columns = df.columns.str.strip().str.lower()
+    Fonction top-level exécutée sur _analysis_pool : la totalité du travail
+    CPU (parse CSV, coercitions, bincount/argpartition) quitte le thread de
+    la boucle d'événements, qui reste libre pour les autres requêtes. Les
+    noyaux pandas/Arrow/NumPy relâchent le GIL, donc le pool de threads
+    partagé suffit — un ProcessPool ajouterait le pickling du DataFrame et
+    du résultat sans gain ici.
+    """
+    df = read_csv_upload_df(source)
 
-    required = {"account", "label", "debit", "credit"}
-    if not required.issubset(df.columns):
+    if not _REQUIRED_AUDIT_COLS.issubset(df.columns):
         raise HTTPException(400, "Colonnes manquantes")
 
-    df["debit"] = pd.to_numeric(df["debit"], errors="coerce").fillna(0)
-    df["credit"] = pd.to_numeric(df["credit"], errors="coerce").fillna(0)
+    # Réductions sur tableaux NumPy bruts : une coercition par colonne, le
+    # vecteur balance calculé une fois et réutilisé par le top-10 plus bas
+    debit = _money_array(df["debit"])
+    credit = _money_array(df["credit"])
+    balance = debit - credit
 
-    total_debit = df["debit"].sum()
-    total_credit = df["credit"].sum()
+    total_debit = float(debit.sum())
+    total_credit = float(credit.sum())
     imbalance = abs(total_debit - total_credit)
 
+    # Scan des montants négatifs dans la même passe mémoire : count_nonzero
+    # sur la comparaison vectorisée, pas de Series booléenne pandas allouée
+    neg_debit = int(np.count_nonzero(debit < 0))
+    neg_credit = int(np.count_nonzero(credit < 0))
+
+    # Enveloppes construites côté serveur à partir de valeurs déjà typées :
+    # model_construct saute la validation pydantic (inutile ici), l'encodage
+    # reste orjson via la classe de réponse par défaut
     issues = []
     if imbalance > 0.01:
         issues.append(
-            AuditIssue(
+            AuditIssue.model_construct(
                 code="IMBALANCE",
                 severity="error",
                 message=f"Écart de {imbalance:.2f}€",
             )
         )
+    if neg_debit:
+        issues.append(
+            AuditIssue.model_construct(
+                code="NEGATIVE_DEBIT",
+                severity="warning",
+                message=f"{neg_debit} ligne(s) avec débit négatif",
+                count=neg_debit,
+            )
+        )
+    if neg_credit:
+        issues.append(
+            AuditIssue.model_construct(
+                code="NEGATIVE_CREDIT",
+                severity="warning",
+                message=f"{neg_credit} ligne(s) avec crédit négatif",
+                count=neg_credit,
+            )
+        )
 
-    summary = AuditSummary(
+    summary = AuditSummary.model_construct(
         ok=imbalance <= 0.01,
         total_rows=len(df),
         total_debit=round(total_debit, 2),
@@ -562,43 +851,205 @@ async def test_audit(
         framework="USGAAP" if standard.upper().startswith("US") else "IFRS",
     )
 
-    df["balance"] = df["debit"] - df["credit"]
-    grp = df.groupby(["account", "label"])["balance"].sum().reset_index()
-    grp["abs_balance"] = grp["balance"].abs()
-    top = grp.sort_values("abs_balance", ascending=False).head(10)
-    top = top.to_dict(orient="records")
+    # Top 10 par solde absolu sans groupby ni tri complet : clés (account,
+    # label) factorisées, sommes par code via bincount pondéré, puis
+    # argpartition pour ne trier que les 10 retenus (O(N) au lieu de O(N log N)).
+    # La paire est factorisée numériquement (code_compte * nb_libellés +
+    # code_libellé) : pas de colonne object concaténée à allouer ni hacher.
+    acct_codes, acct_uniques = pd.factorize(df["account"].astype(str))
+    label_codes, label_uniques = pd.factorize(df["label"].astype(str))
+
+    # Libellés manquants sans nouvelle passe object : le test ne porte que
+    # sur les uniques (petits) — vides et sentinelles NaN issues de
+    # l'astype(str) — puis le comptage est une passe entière sur les codes
+    empty_u = np.array(
+        [i for i, u in enumerate(label_uniques)
+         if str(u).strip().lower() in ("", "nan", "none", "<na>")],
+        dtype=np.intp,
+    )
+    missing_labels = int(np.isin(label_codes, empty_u).sum()) if len(empty_u) else 0
+    if missing_labels:
+        issues.append(
+            AuditIssue.model_construct(
+                code="MISSING_LABELS",
+                severity="warning",
+                message=f"{missing_labels} ligne(s) sans libellé",
+                count=missing_labels,
+            )
+        )
 
-    result = AuditResult(summary=summary, issues=issues, top_accounts=top)
-    
-    return JSONResponse(
-        content=result.model_dump(),
-        headers=get_cors_headers()
+    # Doublons de comptes gratuits : la factorisation ci-dessus a déjà fait
+    # le hachage, le surplus lignes - uniques est le nombre de doublons
+    dup_accounts = int(len(acct_codes) - len(acct_uniques))
+    if dup_accounts:
+        issues.append(
+            AuditIssue.model_construct(
+                code="DUPLICATE_ACCOUNTS",
+                severity="info",
+                message=f"{dup_accounts} ligne(s) partagent un numéro de compte déjà vu",
+                count=dup_accounts,
+            )
+        )
+
+    n_labels = max(len(label_uniques), 1)
+    pair = acct_codes.astype(np.int64) * n_labels + label_codes
+    codes, pair_uniques = pd.factorize(pair)
+    sums = np.bincount(codes, weights=balance, minlength=len(pair_uniques))
+    abs_sums = np.abs(sums)
+    k = min(10, len(sums))
+    idx = np.argpartition(-abs_sums, k - 1)[:k] if k else np.array([], dtype=np.intp)
+    idx = idx[np.argsort(-abs_sums[idx], kind="stable")]
+    top = []
+    for i in idx:
+        p = int(pair_uniques[i])
+        top.append({
+            "account": str(acct_uniques[p // n_labels]),
+            "label": str(label_uniques[p % n_labels]),
+            "balance": float(sums[i]),
+            "abs_balance": float(abs_sums[i]),
+        })
+
+    return AuditResult.model_construct(summary=summary, issues=issues, top_accounts=top)
+
+
+@app.post("/audit/test", response_model=AuditResult)
+async def test_audit(
+    file: UploadFile = File(...),
+    standard: str = Form("IFRS"),
+    company_id: str = Depends(require_auth),
+):
+    check_csv_upload(file)
+    # Lecture directe du fichier spoolé de Starlette : pas de copie intégrale
+    # du corps en RAM avant traitement
+    result = await asyncio.get_running_loop().run_in_executor(
+        _analysis_pool, functools.partial(_run_audit, file.file, standard)
     )
+    # exclude_none : les AuditIssue sans compteur ne transportent pas count=null
+    return fast_json(result, exclude_none=True)
 
 
 # =====================================================
 # API DOCUMENTATION
 # =====================================================
+# La table des routes est figée après le démarrage : le corps JSON est
+# encodé une seule fois (orjson) et resservi tel quel.
+_routes_cache: bytes | None = None
+
+
 @app.get("/api/routes")
 def list_routes():
     """List all available API routes"""
-    routes = []
-    for route in app.routes:
-        if hasattr(route, "methods") and hasattr(route, "path"):
-            routes.append({
-                "path": route.path,
-                "methods": list(route.methods),
-                "name": route.name
-            })
-    
-    return JSONResponse(
-        content={
+    global _routes_cache
+    if _routes_cache is None:
+        routes = []
+        for route in app.routes:
+            if hasattr(route, "methods") and hasattr(route, "path"):
+                routes.append({
+                    "path": route.path,
+                    "methods": list(route.methods),
+                    "name": route.name
+                })
+        _routes_cache = orjson.dumps({
             "total_routes": len(routes),
             "routes": sorted(routes, key=lambda x: x["path"]),
             "banking_integration": True
-        },
-        headers=get_cors_headers()
+        })
+
+    return PlainResponse(content=_routes_cache, media_type="application/json")
+
+
+# =====================================================
+# BATCH MULTIPLEXING
+# =====================================================
+class BatchSubRequest(BaseModel):
+    id: str
+    url: str
+    method: str = "GET"
+    body: Optional[dict] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+
+async def _dispatch_in_process(request: Request, sub: BatchSubRequest) -> dict:
+    """Rejoue une sous-requête JSON à travers la pile ASGI, sans réseau.
+
+    Le scope minimal reprend le cookie de la requête porteuse (l'auth des
+    sous-requêtes fonctionne donc normalement) ; la réponse est collectée en
+    mémoire et renvoyée décodée.
+    """
+    body_bytes = orjson.dumps(sub.body) if sub.body is not None else b""
+    # Le routeur ne voit que le path : la query string part dans son champ
+    # dédié du scope (sinon /health?x=1 ne matche aucune route)
+    path, _, query = sub.url.partition("?")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": sub.method.upper(),
+        "path": path,
+        "raw_path": sub.url.encode(),
+        "query_string": query.encode(),
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body_bytes)).encode()),
+            (b"cookie", request.headers.get("cookie", "").encode()),
+            (b"host", request.headers.get("host", "").encode()),
+            (b"x-forwarded-proto", b"https"),
+        ],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "scheme": "https",
+        "root_path": "",
+        "app": app,
+    }
+
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body_bytes, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    status = 500
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    raw = b"".join(chunks)
+    try:
+        body = orjson.loads(raw) if raw else None
+    except orjson.JSONDecodeError:
+        body = raw.decode(errors="replace")
+    return {"id": sub.id, "status": status, "body": body}
+
+
+@app.post("/batch")
+async def batch_endpoint(request: Request, payload: BatchRequest):
+    """Multiplexe plusieurs appels JSON en un seul aller-retour HTTPS.
+
+    Depuis GitHub Pages vers Railway, chaque requête paie la RTT
+    trans-continentale : le front peut en regrouper jusqu'à 20 ici, elles
+    sont servies en parallèle dans le processus.
+    """
+    if len(payload.requests) > 20:
+        raise HTTPException(400, "20 sous-requêtes max par lot")
+    for sub in payload.requests:
+        if sub.url.partition("?")[0].rstrip("/") == "/batch":
+            raise HTTPException(400, "Lot récursif interdit")
+
+    responses = await asyncio.gather(
+        *(_dispatch_in_process(request, sub) for sub in payload.requests)
     )
+    return {"responses": list(responses)}
 
 
 # =====================================================
@@ -606,9 +1057,14 @@ def list_routes():
 # =====================================================
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    # Trace complète dans les logs ; le corps renvoyé est borné — certains
+    # messages pandas/sqlalchemy font plusieurs Mo et chaque octet serait
+    # échappé puis encodé dans la réponse
+    logging.getLogger("numma").exception("Unhandled error on %s", request.url.path, exc_info=exc)
+    # Ce handler tourne hors de CORSMiddleware : on pose les en-têtes nous-mêmes
+    return ORJSONResponse(
         status_code=500,
-        content={"detail": str(exc)},
+        content={"detail": str(exc)[:512]},
         headers=get_cors_headers()
     )
 
@@ -618,44 +1074,17 @@ async def global_exception_handler(request: Request, exc: Exception):
 # =====================================================
 @app.on_event("startup")
 async def startup_message():
-    print("\n" + "="*70)
-    print("🚀 NUMMA Backend API v2.0 - Ready!")
-    print("="*70)
-    print(f"📡 Environment: {'Production' if os.getenv('RAILWAY_ENVIRONMENT') else 'Development'}")
-    print(f"🔗 CORS: {', '.join(ALLOWED_ORIGINS[:2])}...")
-    print(f"🔐 HTTPS: Enforced")
-    print(f"💾 Database: PostgreSQL")
-    print(f"🤖 OpenAI: {'Enabled' if OPENAI_API_KEY else 'Disabled'}")
-    print(f"🏦 Banking: ✅ Enabled")
-    
-    print("\n📋 Core Modules (11):")
-    print("  ✅ Authentication & Security")
-    print("  ✅ Bank Transactions")
-    print("  ✅ Invoices (Sales/Purchases)")
-    print("  ✅ Cashflow Management")
-    print("  ✅ Alerts & Notifications")
-    print("  ✅ Overdue Tracking")
-    print("  ✅ Employees & HR")
-    print("  ✅ Tasks Management")
-    print("  ✅ Time Tracking (Pointages)")
-    print("  ✅ User Management")
-    print("  ✅ Email Import")
-    print("  ✅ Finance Routes")
-    print("  ✅ AI Chat (Albert)")
-    
-    print("\n🆕 Banking Integration v2.0 (7):")
-    print("  ✅ Multi-Bank Accounts")
-    print("  ✅ Sync (Bankin/Finary/Bridge)")
-    print("  ✅ Auto-Categorization")
-    print("  ✅ Smart Budgets")
-    print("  ✅ Advanced Analytics")
-    print("  ✅ Real-time Webhooks")
-    print("  ✅ Accounting Exports (FEC)")
-    
-    print(f"\n📊 Total Routers: 18")
-    print(f"📍 Total Endpoints: ~140")
-    print(f"🗄️  Total Models: 19")
-    print("\n🌐 API Documentation: /docs")
-    print("💚 Health Check: /health")
-    print("📚 Routes List: /api/routes")
-    print("="*70 + "\n")
+    # En production (log shipping Railway), chaque print verrouille et flushe
+    # stdout ; la bannière ne sert qu'en local. Un seul logger.info, zéro en prod.
+    if os.getenv("RAILWAY_ENVIRONMENT"):
+        return
+    banner = "\n".join([
+        "=" * 70,
+        "🚀 NUMMA Backend API v2.0 - Ready!",
+        "=" * 70,
+        f"🔗 CORS: {', '.join(ALLOWED_ORIGINS[:2])}...",
+        f"🤖 OpenAI: {'Enabled' if OPENAI_API_KEY else 'Disabled'}",
+        "📊 Total Routers: 18 | 🌐 Docs: /docs | 💚 Health: /health | 📚 Routes: /api/routes",
+        "=" * 70,
+    ])
+    logging.getLogger("numma").info(banner)
@@ -6,11 +6,16 @@ FIXED: All 'metadata' fields renamed to 'provider_metadata'
 
 from sqlalchemy import (
     Column, Integer, String, Numeric, Date, Text, ForeignKey,
-    Boolean, JSON, TIMESTAMP, func
+    Boolean, Index, JSON, TIMESTAMP, func, text
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+# JSONB côté Postgres (binaire, clés indexables) tout en restant portable
+# sur les autres dialectes ; JSON texte est re-parsé à chaque accès
+_JSONColumn = JSON().with_variant(JSONB(), "postgresql")
+
 
 # ============================================
 # BANK ACCOUNTS
@@ -37,7 +42,7 @@ class BankAccount(Base):
     provider = Column(String(50))  # bankin, finary, bridge, manual
     
     # FIXED: renamed from metadata to provider_metadata (SQLAlchemy reserved word)
-    provider_metadata = Column(JSON)  # Store full JSON response from aggregator
+    provider_metadata = Column(_JSONColumn)  # Store full JSON response from aggregator
     
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -55,7 +60,21 @@ class BankTransactionEnhanced(Base):
     Enhanced transactions table with categorization and external sync
     """
     __tablename__ = "bank_transactions_enhanced"
-    
+    # Index composites alignés sur les accès réels ("transactions du compte X
+    # sur la période", "dépenses de la catégorie Y par mois") : un seul range
+    # scan ordonné par date au lieu d'un BitmapAnd entre index mono-colonnes.
+    # L'index partiel ne couvre que les lignes récurrentes (rares).
+    __table_args__ = (
+        Index("ix_bte_account_date", "account_id", "date"),
+        Index("ix_bte_category_date", "category_id", "date"),
+        Index(
+            "ix_bte_recurring",
+            "is_recurring",
+            "account_id",
+            postgresql_where=text("is_recurring"),
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     account_id = Column(Integer, ForeignKey("bank_accounts.id"), nullable=False)
     external_id = Column(String(255), unique=True, index=True)  # ID from aggregator
@@ -83,12 +102,14 @@ class BankTransactionEnhanced(Base):
     is_internal_transfer = Column(Boolean, default=False)
     
     # FIXED: renamed from metadata to provider_metadata
-    provider_metadata = Column(JSON)  # Metadata from aggregator
+    provider_metadata = Column(_JSONColumn)  # Metadata from aggregator
     
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     
-    # Relations
+    # Relations — lazy par défaut : aucun endpoint ne sérialise ces objets
+    # (les listes renvoient la chaîne sub_category) ; un selectinload()
+    # par requête suffira le jour où une vue les affichera
     account = relationship("BankAccount", back_populates="transactions")
     category = relationship("Category")
 
@@ -192,7 +213,7 @@ class SyncLog(Base):
     duration_seconds = Column(Integer)
     
     # FIXED: renamed from metadata to provider_metadata
-    provider_metadata = Column(JSON)  # Additional sync metadata
+    provider_metadata = Column(_JSONColumn)  # Additional sync metadata
     
     created_at = Column(TIMESTAMP, server_default=func.now())
     
@@ -275,14 +296,19 @@ class WebhookEvent(Base):
     Store webhook events from external providers
     """
     __tablename__ = "webhook_events"
-    
+    # GIN sur le payload : les filtres payload->>'...' deviennent des
+    # lookups indexés au lieu d'un scan séquentiel avec re-parse JSON
+    __table_args__ = (
+        Index("ix_webhook_payload_gin", "payload", postgresql_using="gin"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     provider = Column(String(50), nullable=False)
     event_type = Column(String(100), nullable=False)
     
     # Data
-    payload = Column(JSON, nullable=False)
-    headers = Column(JSON)
+    payload = Column(_JSONColumn, nullable=False)
+    headers = Column(_JSONColumn)
     
     # Processing
     status = Column(String(20), default="pending")  # pending, processed, failed
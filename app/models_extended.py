@@ -84,7 +84,9 @@ class InvoicePurchase(Base):
     status = Column(String(50), default="pending")
     paid_at = Column(Date)
     created_at = Column(TIMESTAMP, server_default=func.now())
-    supplier = relationship("Supplier")
+    # selectin : les listes de factures chargent leurs fournisseurs en une
+    # requête IN au lieu d'un SELECT par facture affichée
+    supplier = relationship("Supplier", lazy="selectin")
 
 
 # ----------------------------
@@ -166,41 +168,8 @@ class Pointage(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
 
 
-# ----------------------------
-# ✅ TASKS (NEW)
-# ----------------------------
-class Task(Base):
-    """Task management - ADDED"""
-    __tablename__ = "tasks"
-
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(255), nullable=False)
-    description = Column(Text)
-    assigned_to = Column(String(255))
-    priority = Column(String(20), default="medium")
-    status = Column(String(20), default="todo")
-    due_date = Column(Date)
-    completed_at = Column(TIMESTAMP)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
-
-
-# ----------------------------
-# ✅ USERS (NEW)
-# ----------------------------
-class User(Base):
-    """User accounts - ADDED"""
-    __tablename__ = "users"
-
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String(255), unique=True, nullable=False, index=True)
-    hashed_password = Column(String(255), nullable=False)
-    company_name = Column(String(255))
-    siret = Column(String(14))
-    is_active = Column(Boolean, default=True)
-    is_admin = Column(Boolean, default=False)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    last_login = Column(TIMESTAMP)
-
-
-print("✅ Extended models loaded - Pointage, Employee, Task, User models added")
+# Task et User vivent dans app/routers/tasks.py et app/routers/users.py :
+# les redéfinir ici enregistrait deux fois "tasks"/"users" sur Base
+# (InvalidRequestError à l'import) et les copies d'ici n'étaient référencées
+# nulle part.
+print("✅ Extended models loaded - Pointage, Employee models added")
@@ -11,6 +11,9 @@ from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date, datetime
 
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+
 from ..database import SessionLocal
 from ..models_banking import BankAccount, BankTransactionEnhanced
 
@@ -323,7 +326,8 @@ def get_account_transactions(
     end_date: Optional[str] = None,
     category: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
     """
     Get transactions for a specific account
@@ -334,12 +338,39 @@ def get_account_transactions(
     - category: Filter by category name
     - limit: Max number of results (default: 100)
     - offset: Skip N results (for pagination)
+    - cursor: Keyset "date:id" de la dernière ligne reçue — O(1) quelle que
+      soit la profondeur, contrairement à offset qui balaie puis jette
     """
+    # Validation du cursor hors du try général : un cursor malformé doit
+    # ressortir en 400, pas en 500, et la date doit être une vraie date
+    # ISO avant d'atteindre le cast SQL
+    cursor_key = None
+    if cursor:
+        try:
+            cur_date, cur_id = cursor.rsplit(":", 1)
+            cursor_key = (date.fromisoformat(cur_date), int(cur_id))
+        except ValueError:
+            raise HTTPException(400, "Cursor invalide (attendu date:id)")
     try:
         with SessionLocal() as db:
+            # load_only : on ne sélectionne que les colonnes renvoyées —
+            # provider_metadata (JSON potentiellement volumineux) reste en
+            # base, pas de détoast ni de parse inutile par ligne
             query = db.query(BankTransactionEnhanced)\
+                .options(load_only(
+                    BankTransactionEnhanced.id,
+                    BankTransactionEnhanced.date,
+                    BankTransactionEnhanced.label,
+                    BankTransactionEnhanced.raw_label,
+                    BankTransactionEnhanced.amount,
+                    BankTransactionEnhanced.balance,
+                    BankTransactionEnhanced.sub_category,
+                    BankTransactionEnhanced.is_recurring,
+                    BankTransactionEnhanced.is_reconciled,
+                ))\
                 .filter(BankTransactionEnhanced.account_id == account_id)\
-                .order_by(BankTransactionEnhanced.date.desc())
+                .order_by(BankTransactionEnhanced.date.desc(),
+                          BankTransactionEnhanced.id.desc())
             
             if start_date:
                 query = query.filter(BankTransactionEnhanced.date >= start_date)
@@ -348,14 +379,30 @@ def get_account_transactions(
             if category:
                 query = query.filter(BankTransactionEnhanced.sub_category == category)
             
-            total = query.count()
-            transactions = query.limit(limit).offset(offset).all()
-            
+            if cursor_key:
+                # Pagination keyset sur (date, id), servie par l'index
+                # composite (account_id, date) : pas de COUNT ni d'OFFSET
+                query = query.filter(
+                    tuple_(BankTransactionEnhanced.date, BankTransactionEnhanced.id)
+                    < cursor_key
+                )
+                transactions = query.limit(limit).all()
+                total = None
+            else:
+                total = query.count()
+                transactions = query.limit(limit).offset(offset).all()
+
+            next_cursor = (
+                f"{transactions[-1].date.isoformat()}:{transactions[-1].id}"
+                if len(transactions) == limit else None
+            )
+
             return JSONResponse(
                 content={
                     "total": total,
                     "limit": limit,
                     "offset": offset,
+                    "next_cursor": next_cursor,
                     "transactions": [{
                         "id": t.id,
                         "date": t.date.isoformat(),
@@ -1,10 +1,11 @@
 import os
 from datetime import date
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
-from ..database import SessionLocal
+from ..database import get_db
 from ..models_extended import Alert
 
 router = APIRouter(prefix="/alerts", tags=["Alerts"])
@@ -34,25 +35,24 @@ class AlertIn(BaseModel):
 # GET /alerts
 # --------------------------
 @router.get("/")
-def list_alerts():
+def list_alerts(db: Session = Depends(get_db)):
     try:
-        with SessionLocal() as db:
-            items = db.query(Alert).order_by(Alert.due_date.asc()).all()
+        items = db.query(Alert).order_by(Alert.due_date.asc()).all()
 
-            data = [
-                {
-                    "id": a.id,
-                    "message": a.message,
-                    "due_date": str(a.due_date),
-                    "type": a.type,
-                }
-                for a in items
-            ]
+        data = [
+            {
+                "id": a.id,
+                "message": a.message,
+                "due_date": str(a.due_date),
+                "type": a.type,
+            }
+            for a in items
+        ]
 
-            return JSONResponse(
-                content=data,
-                headers=get_cors_headers()
-            )
+        return JSONResponse(
+            content=data,
+            headers=get_cors_headers()
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -65,27 +65,27 @@ def list_alerts():
 # POST /alerts
 # --------------------------
 @router.post("/")
-def create_alert(alert: AlertIn):
+def create_alert(alert: AlertIn, db: Session = Depends(get_db)):
     try:
-        with SessionLocal() as db:
-            a = Alert(
-                message=alert.message,
-                due_date=alert.due_date,
-                type="fiscal"
-            )
-            db.add(a)
-            db.commit()
-            db.refresh(a)
+        a = Alert(
+            message=alert.message,
+            due_date=alert.due_date,
+            type="fiscal"
+        )
+        db.add(a)
+        db.commit()
+        # pas de refresh : l'id est posé par l'INSERT et expire_on_commit=False
+        # garde les attributs chargés — on évite un SELECT par création
 
-            return JSONResponse(
-                content={
-                    "id": a.id,
-                    "message": a.message,
-                    "due_date": str(a.due_date),
-                    "type": a.type,
-                },
-                headers=get_cors_headers()
-            )
+        return JSONResponse(
+            content={
+                "id": a.id,
+                "message": a.message,
+                "due_date": str(a.due_date),
+                "type": a.type,
+            },
+            headers=get_cors_headers()
+        )
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -3,14 +3,28 @@ Analytics Router - KPIs, Statistics, and Financial Analysis
 """
 
 import os
+import re
 from datetime import date, timedelta
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from typing import Optional
 
-from ..database import SessionLocal
-from ..models_banking import BankAccount, BankTransactionEnhanced, Category
-from sqlalchemy import func, extract
+import numpy as np
+import pandas as pd
+
+from sqlalchemy.orm import load_only
+
+from ..database import SessionLocal, engine
+from ..models_banking import BankAccount, BankTransactionEnhanced, Category, RecurringTransaction
+from sqlalchemy import func, extract, select, insert, delete, text
+
+# rapidfuzz (C++/SIMD) pour le clustering de labels — optionnel, on retombe
+# sur un groupement exact si absent
+try:
+    from rapidfuzz import fuzz
+    from rapidfuzz.process import cdist as _rf_cdist
+except ImportError:
+    _rf_cdist = None
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
@@ -28,53 +42,64 @@ def get_cors_headers():
 # OVERVIEW DASHBOARD
 # ============================================
 
+# Un seul aller-retour SQL pour tout le dashboard : les agrégats
+# transactions et comptes sont des CTE jointes en CROSS JOIN, Postgres
+# fait les sommes (FILTER) au lieu de rapatrier chaque ligne en Python
+_OVERVIEW_SQL = text("""
+    WITH tx AS (
+        SELECT
+            COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0)  AS income,
+            COALESCE(-SUM(amount) FILTER (WHERE amount < 0), 0) AS expenses,
+            COUNT(*)                                            AS trans_count
+        FROM bank_transactions_enhanced
+        WHERE date >= :start_date AND date <= :end_date
+    ), acc AS (
+        SELECT
+            COALESCE(SUM(balance), 0) AS total_balance,
+            COUNT(*)                  AS accounts_count
+        FROM bank_accounts
+        WHERE is_active
+    )
+    SELECT tx.income, tx.expenses, tx.trans_count,
+           acc.total_balance, acc.accounts_count
+    FROM tx CROSS JOIN acc
+""")
+
+
 @router.get("/overview")
 def get_overview(days: int = 30):
-    """Get financial overview for dashboard"""
+    """Get financial overview for dashboard (single aggregate query)"""
     try:
-        from datetime import date, timedelta
-        
         with SessionLocal() as db:
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
-            
-            # Get all transactions in period
-            transactions = db.query(BankTransactionEnhanced)\
-                .filter(
-                    BankTransactionEnhanced.date >= start_date,
-                    BankTransactionEnhanced.date <= end_date
-                )\
-                .all()
-            
-            # Calculate metrics
-            income = sum(float(t.amount) for t in transactions if t.amount > 0)
-            expenses = sum(abs(float(t.amount)) for t in transactions if t.amount < 0)
+
+            row = db.execute(
+                _OVERVIEW_SQL,
+                {"start_date": start_date, "end_date": end_date},
+            ).one()
+
+            income = float(row.income)
+            expenses = float(row.expenses)
             net = income - expenses
-            
+
             # Average per day
             avg_daily_income = income / days if days > 0 else 0
             avg_daily_expenses = expenses / days if days > 0 else 0
-            
-            # Current balance from all accounts
-            accounts = db.query(BankAccount).filter(BankAccount.is_active == True).all()
-            total_balance = sum(float(acc.balance or 0) for acc in accounts)
-            
-            # Transaction count
-            trans_count = len(transactions)
-            
+
             return JSONResponse(
                 content={
                     "period_days": days,
                     "start_date": start_date.isoformat(),
                     "end_date": end_date.isoformat(),
-                    "total_balance": round(total_balance, 2),
+                    "total_balance": round(float(row.total_balance), 2),
                     "income": round(income, 2),
                     "expenses": round(expenses, 2),
                     "net": round(net, 2),
                     "avg_daily_income": round(avg_daily_income, 2),
                     "avg_daily_expenses": round(avg_daily_expenses, 2),
-                    "transaction_count": trans_count,
-                    "accounts_count": len(accounts)
+                    "transaction_count": row.trans_count,
+                    "accounts_count": row.accounts_count
                 },
                 headers=get_cors_headers()
             )
@@ -274,8 +299,14 @@ def get_recurring_transactions():
     """Detect recurring transactions (subscriptions, bills)"""
     try:
         with SessionLocal() as db:
-            # Get all transactions
+            # Get all transactions (colonnes utilisées seulement — pas de
+            # raw_label ni provider_metadata)
             transactions = db.query(BankTransactionEnhanced)\
+                .options(load_only(
+                    BankTransactionEnhanced.label,
+                    BankTransactionEnhanced.amount,
+                    BankTransactionEnhanced.sub_category,
+                ))\
                 .filter(BankTransactionEnhanced.is_recurring == True)\
                 .order_by(BankTransactionEnhanced.date.desc())\
                 .limit(100)\
@@ -315,6 +346,182 @@ def get_recurring_transactions():
             headers=get_cors_headers()
         )
 
+# Bruit à retirer des labels avant clustering : numéros de carte, dates,
+# références — tout ce qui change d'une occurrence à l'autre du même marchand
+_LABEL_NOISE = re.compile(r"[\d/#*]+")
+
+# Période dominante (jours) -> colonnes du modèle RecurringTransaction
+_FREQUENCIES = [
+    ((6.0, 8.5), "weekly"),
+    ((13.0, 16.0), "weekly"),      # bi-mensuel, rangé avec weekly faute d'enum dédié
+    ((26.0, 35.0), "monthly"),
+    ((85.0, 100.0), "monthly"),    # trimestriel
+    ((330.0, 400.0), "yearly"),
+]
+
+
+def cluster_labels(labels, threshold: float = 85.0):
+    """
+    Regroupe des labels normalisés par similarité fuzzy.
+
+    La matrice labels × labels est calculée en un seul appel
+    rapidfuzz.process.cdist (token_set_ratio, tous les cœurs, GIL
+    relâché), puis un union-find fait le single-linkage sur les paires
+    au-dessus du seuil. Retourne un id de cluster par label. Sans
+    rapidfuzz, chaque label garde son propre cluster (groupement exact).
+    """
+    n = len(labels)
+    if _rf_cdist is None or n < 2:
+        return list(range(n))
+
+    sim = _rf_cdist(labels, labels, scorer=fuzz.token_set_ratio, workers=-1)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in np.argwhere(np.triu(sim >= threshold, k=1)):
+        ri, rj = find(int(i)), find(int(j))
+        if ri != rj:
+            parent[rj] = ri
+
+    return [find(i) for i in range(n)]
+
+
+def detect_recurring(account_id: int, min_occurrences: int = 4):
+    """
+    Détection vectorisée des transactions récurrentes d'un compte.
+
+    Une seule requête charge (date, amount, label) dans un DataFrame ;
+    les labels sont normalisés par regex vectorisée puis, pour chaque
+    cluster d'au moins `min_occurrences` opérations, on bucketise le
+    signal au jour et on cherche la période dominante dans le spectre
+    (np.fft.rfft). La confiance est le rapport puissance du pic /
+    puissance moyenne du spectre — aucun calcul par ligne en Python.
+
+    Les résultats remplacent les lignes RecurringTransaction existantes
+    du compte via un seul bulk insert Core. Retourne la liste des
+    patterns détectés.
+    """
+    with engine.connect() as conn:
+        df = pd.read_sql(
+            select(
+                BankTransactionEnhanced.date,
+                BankTransactionEnhanced.amount,
+                BankTransactionEnhanced.label,
+            ).where(BankTransactionEnhanced.account_id == account_id),
+            conn,
+        )
+
+    detected = []
+    if not df.empty:
+        df["pattern"] = (
+            df["label"].astype(str).str.lower()
+            .str.replace(_LABEL_NOISE, " ", regex=True)
+            .str.split().str.join(" ")
+        )
+        dates = pd.to_datetime(df["date"])
+        df["day"] = dates.values.astype("datetime64[D]").astype(np.int64)
+
+        # Fusion fuzzy des variantes du même marchand ("prlv sepa netflix",
+        # "carte netflix") avant l'analyse de périodicité
+        df = df[df["pattern"] != ""]
+        uniques = df["pattern"].unique().tolist()
+        df["cluster"] = df["pattern"].map(
+            dict(zip(uniques, cluster_labels(uniques)))
+        )
+
+        for _, group in df.groupby("cluster"):
+            if len(group) < min_occurrences:
+                continue
+            # Le pattern le plus fréquent du cluster sert de libellé
+            pattern = group["pattern"].mode().iat[0]
+            days = np.unique(group["day"].to_numpy())
+            span = int(days[-1] - days[0])
+            if len(days) < min_occurrences or span < 14:
+                continue
+
+            # Signal binaire journalier, centré, puis spectre d'amplitude
+            signal = np.zeros(span + 1)
+            signal[days - days[0]] = 1.0
+            spectrum = np.abs(np.fft.rfft(signal - signal.mean()))
+            if spectrum.size < 3:
+                continue
+            k = int(np.argmax(spectrum[1:])) + 1
+            period = signal.size / k
+            confidence = float(
+                min(1.0, spectrum[k] / (4.0 * spectrum[1:].mean() + 1e-12))
+            )
+
+            frequency = next(
+                (name for (lo, hi), name in _FREQUENCIES if lo <= period <= hi),
+                None,
+            )
+            if frequency is None or confidence < 0.3:
+                continue
+
+            amounts = np.abs(group["amount"].to_numpy(dtype=np.float64))
+            last_day = pd.Timestamp(int(days[-1]), unit="D").date()
+            group_dates = dates[group.index]
+            detected.append({
+                "account_id": account_id,
+                "label_pattern": pattern[:255],
+                "amount_min": round(float(amounts.min()), 2),
+                "amount_max": round(float(amounts.max()), 2),
+                "frequency": frequency,
+                "day_of_month": int(group_dates.dt.day.median()),
+                "day_of_week": int(group_dates.dt.dayofweek.median()),
+                "last_occurrence_date": last_day,
+                "next_expected_date": last_day + timedelta(days=round(period)),
+                "confidence": round(confidence, 2),
+                "occurrence_count": int(len(days)),
+                "is_active": True,
+            })
+
+    with SessionLocal() as db:
+        db.execute(
+            delete(RecurringTransaction)
+            .where(RecurringTransaction.account_id == account_id)
+        )
+        if detected:
+            db.execute(insert(RecurringTransaction), detected)
+        db.commit()
+
+    return detected
+
+
+@router.post("/recurring/detect")
+def run_recurring_detection(account_id: int):
+    """Recompute RecurringTransaction rows for an account (FFT-based)"""
+    try:
+        detected = detect_recurring(account_id)
+        return JSONResponse(
+            content={
+                "account_id": account_id,
+                "detected_count": len(detected),
+                "recurring": [
+                    {
+                        "label_pattern": d["label_pattern"],
+                        "frequency": d["frequency"],
+                        "confidence": d["confidence"],
+                        "occurrence_count": d["occurrence_count"],
+                        "next_expected_date": d["next_expected_date"].isoformat(),
+                    }
+                    for d in detected
+                ],
+            },
+            headers=get_cors_headers()
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)},
+            headers=get_cors_headers()
+        )
+
 # ============================================
 # FORECAST
 # ============================================
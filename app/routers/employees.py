@@ -8,7 +8,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from typing import Optional, List
 from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 
 from app.database import get_db
 from app.models_extended import Employee
@@ -41,8 +41,9 @@ class EmployeeResponse(BaseModel):
     start_date: Optional[str]
     status: str
 
-    class Config:
-        from_attributes = True
+    # frozen: instances immuables construites côté serveur uniquement —
+    # avec model_construct, aucune repasse de validation par ligne
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 # ============================================================
@@ -80,7 +81,9 @@ async def get_employees(
         employees = query.all()
         
         return [
-            EmployeeResponse(
+            # model_construct : les valeurs sortent de la base, déjà typées —
+            # on saute la validation pydantic par ligne
+            EmployeeResponse.model_construct(
                 id=emp.id,
                 first_name=emp.first_name,
                 last_name=emp.last_name,
@@ -110,7 +113,7 @@ async def get_employee(
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    return EmployeeResponse(
+    return EmployeeResponse.model_construct(
         id=employee.id,
         first_name=employee.first_name,
         last_name=employee.last_name,
@@ -154,7 +157,7 @@ async def create_employee(
         
         print(f"✅ Employee created: {new_employee.first_name} {new_employee.last_name}")
         
-        return EmployeeResponse(
+        return EmployeeResponse.model_construct(
             id=new_employee.id,
             first_name=new_employee.first_name,
             last_name=new_employee.last_name,
@@ -11,6 +11,8 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
+from sqlalchemy import insert
+
 from ..database import SessionLocal
 from ..models_banking import BankAccount, BankTransactionEnhanced, SyncLog
 
@@ -31,6 +33,16 @@ def get_cors_headers():
 # REQUEST MODELS
 # ============================================
 
+def bulk_insert_transactions(db, rows, chunk_size: int = 1000) -> None:
+    """Insertion Core executemany par paquets : pas d'unité de travail ORM.
+
+    Un INSERT multi-lignes par paquet de 1000 au lieu d'un flush par objet —
+    c'est le chemin rapide SQLAlchemy pour l'ingestion de masse.
+    """
+    for i in range(0, len(rows), chunk_size):
+        db.execute(insert(BankTransactionEnhanced), rows[i:i + chunk_size])
+
+
 class SyncRequest(BaseModel):
     provider: str  # bankin, finary, bridge
     access_token: str
@@ -136,30 +148,35 @@ async def sync_from_bankin(request: SyncRequest):
                     
                     if trans_response.status_code == 200:
                         transactions = trans_response.json().get("resources", [])
-                        
-                        for bankin_trans in transactions:
-                            # Check if already exists
-                            existing = db.query(BankTransactionEnhanced)\
-                                .filter(BankTransactionEnhanced.external_id == bankin_trans["id"])\
-                                .first()
-                            
-                            if not existing:
-                                # Parse date
-                                trans_date = datetime.fromisoformat(bankin_trans["date"].replace("Z", "+00:00")).date()
-                                
-                                db_trans = BankTransactionEnhanced(
-                                    account_id=db_account.id,
-                                    external_id=bankin_trans["id"],
-                                    date=trans_date,
-                                    label=bankin_trans.get("description"),
-                                    raw_label=bankin_trans.get("raw_description"),
-                                    amount=bankin_trans.get("amount", 0),
-                                    balance=bankin_trans.get("balance"),
-                                    metadata=bankin_trans
-                                )
-                                db.add(db_trans)
-                                total_transactions += 1
-                        
+
+                        # Déduplication en une requête IN au lieu d'un
+                        # SELECT par transaction reçue
+                        fetched_ids = [t["id"] for t in transactions]
+                        existing_ids = {
+                            row[0]
+                            for row in db.query(BankTransactionEnhanced.external_id)
+                            .filter(BankTransactionEnhanced.external_id.in_(fetched_ids))
+                            .all()
+                        } if fetched_ids else set()
+
+                        rows = [
+                            {
+                                "account_id": db_account.id,
+                                "external_id": t["id"],
+                                "date": datetime.fromisoformat(t["date"].replace("Z", "+00:00")).date(),
+                                "label": t.get("description"),
+                                "raw_label": t.get("raw_description"),
+                                "amount": t.get("amount", 0),
+                                "balance": t.get("balance"),
+                                "provider_metadata": t,
+                            }
+                            for t in transactions
+                            if t["id"] not in existing_ids
+                        ]
+                        if rows:
+                            bulk_insert_transactions(db, rows)
+                            total_transactions += len(rows)
+
                         db.commit()
                 
                 # Update sync log
@@ -323,26 +340,31 @@ def manual_import(transactions: List[ManualTransactionImport]):
     - Correcting data
     """
     try:
-        created_count = 0
-        
         with SessionLocal() as db:
-            for trans in transactions:
-                # Verify account exists
-                account = db.query(BankAccount).filter(BankAccount.id == trans.account_id).first()
-                if not account:
-                    continue
-                
-                db_trans = BankTransactionEnhanced(
-                    account_id=trans.account_id,
-                    date=trans.date,
-                    label=trans.label,
-                    amount=trans.amount,
-                    balance=trans.balance,
-                    sub_category=trans.category
-                )
-                db.add(db_trans)
-                created_count += 1
-            
+            # Valide tous les comptes en une requête, puis un seul INSERT
+            # multi-lignes — plus de SELECT + add par transaction importée
+            wanted_ids = {t.account_id for t in transactions}
+            valid_ids = {
+                row[0]
+                for row in db.query(BankAccount.id).filter(BankAccount.id.in_(wanted_ids)).all()
+            } if wanted_ids else set()
+
+            rows = [
+                {
+                    "account_id": t.account_id,
+                    "date": t.date,
+                    "label": t.label,
+                    "amount": t.amount,
+                    "balance": t.balance,
+                    "sub_category": t.category,
+                }
+                for t in transactions
+                if t.account_id in valid_ids
+            ]
+            if rows:
+                bulk_insert_transactions(db, rows)
+            created_count = len(rows)
+
             db.commit()
         
         return JSONResponse(
@@ -5,11 +5,15 @@ Webhooks Router - Handle callbacks from Bankin/Finary/Bridge
 import os
 import hmac
 import hashlib
+
+import orjson
 from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException, Header
 from fastapi.responses import JSONResponse
 from typing import Optional
 
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
 from ..database import SessionLocal
 from ..models_banking import WebhookEvent, BankAccount, BankTransactionEnhanced
 
@@ -30,6 +34,36 @@ def get_cors_headers():
         "Access-Control-Allow-Headers": "*"
     }
 
+# ============================================
+# IDEMPOTENT INGEST
+# ============================================
+
+def ingest_webhook(db, provider: str, event_type, payload: dict,
+                   headers: dict, external_event_id=None):
+    """Insère l'événement en un seul INSERT ... ON CONFLICT DO NOTHING.
+
+    Retourne l'id de la ligne créée, ou None si external_event_id a déjà été
+    vu — la déduplication se joue dans l'index unique, sans SELECT préalable
+    ni course entre livraisons concurrentes du même événement.
+    """
+    stmt = (
+        pg_insert(WebhookEvent)
+        .values(
+            provider=provider,
+            event_type=event_type,
+            payload=payload,
+            headers=headers,
+            status="pending",
+            external_event_id=external_event_id,
+        )
+        .on_conflict_do_nothing(index_elements=["external_event_id"])
+        .returning(WebhookEvent.id)
+    )
+    row = db.execute(stmt).first()
+    db.commit()
+    return row[0] if row else None
+
+
 # ============================================
 # SIGNATURE VERIFICATION
 # ============================================
@@ -94,18 +128,31 @@ async def bankin_webhook(
         
         # Store webhook event
         with SessionLocal() as db:
-            webhook = WebhookEvent(
+            webhook_id = ingest_webhook(
+                db,
                 provider="bankin",
                 event_type=event_type,
                 payload=payload,
                 headers=dict(request.headers),
-                status="pending",
-                external_event_id=payload.get("id")
+                external_event_id=payload.get("id"),
             )
-            db.add(webhook)
-            db.commit()
-            db.refresh(webhook)
-            
+            if webhook_id is None:
+                # Livraison déjà vue. On n'acquitte sans retraiter que si
+                # le premier passage a abouti : un événement failed est
+                # rejoué sur le retry du provider au lieu d'être perdu
+                webhook = db.query(WebhookEvent)\
+                    .filter(WebhookEvent.external_event_id == payload.get("id"))\
+                    .first()
+                if webhook is None or webhook.status != "failed":
+                    return JSONResponse(
+                        content={"status": "ok", "duplicate": True},
+                        headers=get_cors_headers()
+                    )
+                webhook.status = "pending"
+                webhook.error_message = None
+            else:
+                webhook = db.get(WebhookEvent, webhook_id)
+
             # Process event
             try:
                 if event_type == "transaction.created":
@@ -126,7 +173,7 @@ async def bankin_webhook(
                             raw_label=event_data.get("raw_description"),
                             amount=event_data.get("amount", 0),
                             balance=event_data.get("balance"),
-                            metadata=event_data
+                            provider_metadata=event_data
                         )
                         db.add(trans)
                 
@@ -261,6 +308,72 @@ async def bridge_webhook(request: Request):
             headers=get_cors_headers()
         )
 
+# ============================================
+# BATCH INGEST (NDJSON)
+# ============================================
+
+@router.post("/batch")
+async def batch_webhooks(request: Request):
+    """Ingestion groupée d'événements webhook, un JSON par ligne (NDJSON).
+
+    Tout le lot part dans un seul INSERT multi-lignes avec
+    ON CONFLICT DO NOTHING : le coût fsync + mise à jour d'index est amorti
+    sur le lot au lieu d'être payé par événement. Les événements sont stockés
+    en "pending" ; le traitement reste asynchrone côté consommateur.
+    """
+    try:
+        body = await request.body()
+        rows = []
+        skipped = 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                evt = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                skipped += 1
+                continue
+            # JSON valide mais pas un objet (42, "x", [1]) : même sort que
+            # les lignes malformées, le reste du lot passe
+            if not isinstance(evt, dict):
+                skipped += 1
+                continue
+            rows.append({
+                "provider": evt.get("provider", "unknown"),
+                "event_type": evt.get("event_type") or evt.get("type") or "unknown",
+                "payload": evt,
+                "headers": None,
+                "status": "pending",
+                "external_event_id": evt.get("id"),
+            })
+
+        inserted = 0
+        if rows:
+            with SessionLocal() as db:
+                stmt = pg_insert(WebhookEvent).on_conflict_do_nothing(
+                    index_elements=["external_event_id"]
+                )
+                result = db.execute(stmt, rows)
+                db.commit()
+                rowcount = getattr(result, "rowcount", None)
+                inserted = rowcount if rowcount is not None and rowcount >= 0 else len(rows)
+
+        return JSONResponse(
+            content={
+                "status": "ok",
+                "received": len(rows) + skipped,
+                "inserted": inserted,
+                "skipped": skipped,
+            },
+            headers=get_cors_headers()
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)},
+            headers=get_cors_headers()
+        )
+
 # ============================================
 # GET WEBHOOK EVENTS
 # ============================================